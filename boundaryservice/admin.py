@@ -1,7 +1,7 @@
 from django.contrib import admin
 from tastypie.models import ApiAccess
 from django.contrib.gis.admin import OSMGeoAdmin
-from boundaryservice.models import BoundarySet, Boundary
+from boundaryservice.models import BoundarySet, Boundary, BoundaryChange
 
 
 class ApiAccessAdmin(admin.ModelAdmin):
@@ -11,14 +11,23 @@ admin.site.register(ApiAccess, ApiAccessAdmin)
 
 
 class BoundarySetAdmin(admin.ModelAdmin):
-    list_filter = ('authority', 'domain')
+    list_filter = ('authority', 'domain', 'live', 'retired')
 
 admin.site.register(BoundarySet, BoundarySetAdmin)
 
 
 class BoundaryAdmin(OSMGeoAdmin):
-    list_display = ('kind', 'name', 'external_id')
+    list_display = ('kind', 'name', 'external_id', 'vertex_count',
+        'simple_vertex_count')
     list_display_links = ('name', 'external_id')
     list_filter = ('kind',)
 
 admin.site.register(Boundary, BoundaryAdmin)
+
+
+class BoundaryChangeAdmin(admin.ModelAdmin):
+    list_display = ('version', 'set_slug', 'set_version', 'action',
+        'external_id', 'slug', 'created_at')
+    list_filter = ('action', 'set_slug')
+
+admin.site.register(BoundaryChange, BoundaryChangeAdmin)
@@ -1,12 +1,34 @@
+from hashlib import md5
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import (pre_save, post_save, pre_delete,
+                                      post_delete)
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
 
 from tastypie.authentication import ApiKeyAuthentication
+from tastypie.models import ApiKey
+
+# How long to cache the user and key for a username, in seconds
+AUTH_CACHE_TIMEOUT = getattr(settings, 'BOUNDARY_SERVICE_AUTH_CACHE_TIMEOUT', 300)
+
+
+def get_credentials_cache_key(username):
+    # Usernames may contain characters memcached doesn't allow in keys
+    return 'boundaryservice:credentials:%s' % md5(username.encode('utf-8')).hexdigest()
 
 
 class NoOpApiKeyAuthentication(ApiKeyAuthentication):
     """
     Allows all users access to all objects, but ensures ApiKeys are properly
     processed for throttling.
+
+    The id, status and key of the user with each username are cached, so
+    keyed requests don't cost any queries; the cache is cleared whenever a
+    user or key changes. The user itself is only fetched if request.user is
+    used.
     """
     def is_authenticated(self, request, **kwargs):
 
@@ -16,14 +38,55 @@ class NoOpApiKeyAuthentication(ApiKeyAuthentication):
         if not username:
             return True
 
+        user_id, is_active, key = self.get_credentials(username)
+
+        if user_id is None:
+            return self._unauthorized()
+
+        request.user = SimpleLazyObject(lambda: User.objects.get(pk=user_id))
+
+        if self.require_active and not is_active:
+            return self._unauthorized()
+
+        if key is None or not api_key or not constant_time_compare(key, api_key):
+            return self._unauthorized()
+
+        return True
+
+    def get_credentials(self, username):
+        """
+        Get the id of the user with a username, whether they are active and
+        their API key. The id and key are None if there is no such user or
+        key.
+
+        Only these are cached, not the user, whose password hash has no
+        business in a shared cache.
+        """
+        cache_key = get_credentials_cache_key(username)
+        credentials = cache.get(cache_key)
+
+        if credentials is not None:
+            return credentials
+
         try:
-            user = User.objects.get(username=username)
+            user_id, is_active = User.objects.values_list('id',
+                'is_active').get(username=username)
         except (User.DoesNotExist, User.MultipleObjectsReturned):
-            return self._unauthorized()
+            user_id, is_active = None, False
+
+        key = None
+
+        if user_id is not None:
+            keys = ApiKey.objects.filter(user=user_id).values_list('key',
+                flat=True)
+
+            if keys:
+                key = keys[0]
 
-        request.user = user
+        credentials = (user_id, is_active, key)
+        cache.set(cache_key, credentials, AUTH_CACHE_TIMEOUT)
 
-        return self.get_key(user, api_key)
+        return credentials
 
     def _get_anonymous_identifier(self, request):
         return 'anonymous_%s' % request.META.get('REMOTE_ADDR', 'noaddr')
@@ -31,3 +94,39 @@ class NoOpApiKeyAuthentication(ApiKeyAuthentication):
     def get_identifier(self, request):
         return request.REQUEST.get(
             'username', self._get_anonymous_identifier(request))
+
+
+def clear_cached_credentials(sender, instance, **kwargs):
+    """
+    Forget the cached credentials of a user whose account or key changed.
+    """
+    if isinstance(instance, ApiKey):
+        username = instance.user.username
+    else:
+        username = instance.username
+
+    cache.delete(get_credentials_cache_key(username))
+
+
+def clear_renamed_credentials(sender, instance, **kwargs):
+    """
+    Forget the cached credentials of a user's old username when they are
+    renamed, so it stops authenticating straight away.
+    """
+    if instance.pk is None:
+        return
+
+    old_usernames = User.objects.filter(pk=instance.pk).values_list(
+        'username', flat=True)
+
+    for username in old_usernames:
+        if username != instance.username:
+            cache.delete(get_credentials_cache_key(username))
+
+pre_save.connect(clear_renamed_credentials, sender=User)
+post_save.connect(clear_cached_credentials, sender=User)
+post_delete.connect(clear_cached_credentials, sender=User)
+post_save.connect(clear_cached_credentials, sender=ApiKey)
+# Keys are deleted along with their user, and post_delete is only sent once
+# the user is gone too, so the key's user must be looked up before then
+pre_delete.connect(clear_cached_credentials, sender=ApiKey)
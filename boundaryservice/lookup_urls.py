@@ -0,0 +1,8 @@
+from django.conf.urls.defaults import patterns
+
+urlpatterns = patterns('boundaryservice.lookups',
+    (r'^1.0/lookup/contains/$', 'contains'),
+    (r'^1.0/lookup/point/$', 'point'),
+    (r'^1.0/lookup/batch/$', 'batch'),
+    (r'^1.0/lookup/boundary/(?P<slug>[\w\d_.-]+)/$', 'detail'),
+)
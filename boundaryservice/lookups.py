@@ -0,0 +1,422 @@
+"""
+Lightweight, read-only views for the hottest lookups: the boundaries
+containing a point, the same for many points at once, and a boundary by its
+slug.
+
+These skip tastypie and the ORM, and run a single SQL query each, returning
+only plain columns and PostGIS-rendered GeoJSON. At most
+BOUNDARY_SERVICE_LOOKUP_CONCURRENCY queries run at once per process, and each
+view closes its database connection as soon as its query is done. When
+served by cooperative workers (e.g. gunicorn's gevent workers, with psycopg2
+made cooperative by psycogreen), a single worker can hold many lookups in
+flight while using no more than that many connections.
+
+Mount them alongside (or instead of) the main API in urls.py::
+
+    (r'', include('boundaryservice.lookup_urls')),
+"""
+import json
+import threading
+from hashlib import md5
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import csrf_exempt
+from tastypie import http
+from tastypie.exceptions import BadRequest, ImmediateHttpResponse
+from tastypie.throttle import BaseThrottle
+from tastypie.utils import is_valid_jsonp_callback_value
+
+from boundaryservice.authentication import NoOpApiKeyAuthentication
+from boundaryservice.models import Boundary, BoundarySet
+from boundaryservice.resources import throttle_cls
+from boundaryservice.tastyhacks import MAX_PRECISION, parse_precision
+
+# How many lookup queries may run at once in each process
+LOOKUP_CONCURRENCY = getattr(settings, 'BOUNDARY_SERVICE_LOOKUP_CONCURRENCY', 10)
+
+# The most points which may be looked up in one batch
+MAX_BATCH_POINTS = getattr(settings, 'BOUNDARY_SERVICE_MAX_BATCH_POINTS', 1000)
+
+# The size (in degrees) of the grid cells points are snapped to before being
+# reverse geocoded, so that nearby points share a cached answer. Points are
+# only snapped when answers are cached.
+POINT_CELL_SIZE = getattr(settings, 'BOUNDARY_SERVICE_POINT_CELL_SIZE', 0.0001)
+
+# How long to cache reverse geocoding answers for, in seconds; 0 disables
+# caching
+POINT_CACHE_TIMEOUT = getattr(settings, 'BOUNDARY_SERVICE_POINT_CACHE_TIMEOUT', 0)
+
+query_slots = threading.BoundedSemaphore(LOOKUP_CONCURRENCY)
+
+authentication = NoOpApiKeyAuthentication()
+throttle = throttle_cls or BaseThrottle()
+
+
+def lookup_view(view):
+    """
+    Give a lookup view the same authentication and throttling as the rest of
+    the API, and serialize the data it returns as JSON(P).
+
+    Only JSON and JSONP are offered: the lookups return little besides
+    short strings, which the binary formats would barely shrink.
+    """
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        auth_result = authentication.is_authenticated(request)
+
+        if isinstance(auth_result, HttpResponse):
+            return auth_result
+
+        identifier = authentication.get_identifier(request)
+
+        if throttle.should_be_throttled(identifier):
+            return http.HttpTooManyRequests()
+
+        if request.GET.get('format', 'json') not in ('json', 'jsonp'):
+            return http.HttpBadRequest(
+                'Lookups are only available as json or jsonp.')
+
+        try:
+            data = view(request, *args, **kwargs)
+        except ImmediateHttpResponse, e:
+            return e.response
+        except BadRequest, e:
+            return http.HttpBadRequest(e.args[0])
+
+        throttle.accessed(identifier, url=request.get_full_path(),
+            request_method=request.method.lower())
+
+        return render(request, data)
+
+    return wrapper
+
+
+def render(request, data):
+    content = json.dumps(data, cls=DjangoJSONEncoder)
+    callback = request.GET.get('callback')
+
+    if callback:
+        if not is_valid_jsonp_callback_value(callback):
+            return http.HttpBadRequest('JSONP callback name is invalid.')
+
+        return HttpResponse('%s(%s)' % (callback, content),
+            content_type='text/javascript')
+
+    return HttpResponse(content, content_type='application/json')
+
+
+def execute(sql, params, **clauses):
+    """
+    Run a query against a read database and return all its rows, holding
+    one of the query slots and closing the connection afterwards.
+
+    The table names, SRID and any extra clauses are filled into the SQL
+    before it is run with the params.
+    """
+    connection = connections[router.db_for_read(Boundary)]
+
+    clauses.update({
+        'boundary': connection.ops.quote_name(Boundary._meta.db_table),
+        'boundaryset': connection.ops.quote_name(BoundarySet._meta.db_table),
+        'srid': Boundary._meta.get_field('shape').srid,
+    })
+
+    with query_slots:
+        try:
+            cursor = connection.cursor()
+            cursor.execute(sql % clauses, params)
+
+            return cursor.fetchall()
+        finally:
+            connection.close()
+
+
+def bad_request(message):
+    return ImmediateHttpResponse(response=http.HttpBadRequest(message))
+
+
+def parse_point(value):
+    """
+    Parse a "lat,lon" pair into (lon, lat) floats.
+    """
+    try:
+        lat, lon = value.split(',')
+
+        return float(lon), float(lat)
+    except (AttributeError, ValueError):
+        raise bad_request("Invalid point '%s'; please provide 'lat,lon'." % value)
+
+
+def parse_sets(request):
+    sets = request.GET.get('sets')
+
+    if not sets:
+        return []
+
+    return sets.split(',')
+
+
+CONTAINS_SQL = """
+    SELECT s.slug, b.slug, b.kind, b.name, b.display_name, b.external_id
+    FROM %(boundary)s b
+    JOIN %(boundaryset)s s ON s.id = b.set_id
+    WHERE s.live
+    AND ST_Contains(b.shape, ST_SetSRID(ST_MakePoint(%%s, %%s), %(srid)i))
+    %(sets)s
+    ORDER BY b.kind, b.display_name
+"""
+
+
+def sets_clause(sets):
+    if not sets:
+        return ''
+
+    return 'AND s.slug IN (%s)' % ', '.join(['%s'] * len(sets))
+
+
+def boundary_row(row):
+    set_slug, slug, kind, name, display_name, external_id = row
+
+    return {
+        'set': set_slug,
+        'slug': slug,
+        'kind': kind,
+        'name': name,
+        'display_name': display_name,
+        'external_id': external_id,
+    }
+
+
+@lookup_view
+def contains(request):
+    """
+    List the boundaries containing ?point=lat,lon, optionally only those in
+    ?sets=a,b.
+    """
+    lon, lat = parse_point(request.GET.get('point'))
+    sets = parse_sets(request)
+
+    rows = execute(CONTAINS_SQL, [lon, lat] + sets, sets=sets_clause(sets))
+
+    return {'objects': [boundary_row(row) for row in rows]}
+
+
+POINT_SQL = """
+    SELECT s.slug, b.slug, b.name, b.external_id
+    FROM %(boundary)s b
+    JOIN %(boundaryset)s s ON s.id = b.set_id
+    WHERE s.live
+    AND ST_Contains(b.shape, ST_SetSRID(ST_MakePoint(%%s, %%s), %(srid)i))
+    %(sets)s
+    ORDER BY s.slug, b.slug
+"""
+
+POINT_FIELDS = ['set', 'slug', 'name', 'external_id']
+
+
+def snap_to_grid(lon, lat):
+    """
+    Snap a point to the nearest corner of the POINT_CELL_SIZE grid. Returns
+    the snapped point and the cell's indexes.
+
+    Snapping moves the point, which can change the answer near a boundary's
+    edge, so points are left alone unless answers are cached.
+    """
+    if not POINT_CELL_SIZE or not POINT_CACHE_TIMEOUT:
+        return (lon, lat), (lon, lat)
+
+    x = int(round(lon / POINT_CELL_SIZE))
+    y = int(round(lat / POINT_CELL_SIZE))
+
+    # Rounded again to shed floating point noise such as 0.30000000000000004
+    return (round(x * POINT_CELL_SIZE, 10), round(y * POINT_CELL_SIZE, 10)), (x, y)
+
+
+def point_cache_key(cell, sets):
+    key = 'boundaryservice:point:%r:%r:%r' % ((POINT_CELL_SIZE,) + cell)
+
+    if sets:
+        key += ':' + md5(','.join(sorted(sets)).encode('utf-8')).hexdigest()
+
+    return key
+
+
+def cacheable(view):
+    """
+    Let clients and proxies cache successful responses for as long as
+    answers are cached here.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+
+        if POINT_CACHE_TIMEOUT and response.status_code == 200:
+            patch_cache_control(response, public=True,
+                max_age=POINT_CACHE_TIMEOUT)
+
+        return response
+
+    return wrapper
+
+
+@cacheable
+@lookup_view
+def point(request):
+    """
+    Reverse geocode ?point=lat,lon: list the set, slug, name and external id
+    of every boundary containing it, in all sets or only those in ?sets=a,b.
+
+    When answers are cached, the point is first snapped to a grid of
+    BOUNDARY_SERVICE_POINT_CELL_SIZE degrees, and answers are cached by grid
+    cell.
+    """
+    (lon, lat), cell = snap_to_grid(*parse_point(request.GET.get('point')))
+    sets = parse_sets(request)
+
+    cache_key = point_cache_key(cell, sets)
+    rows = None
+
+    if POINT_CACHE_TIMEOUT:
+        rows = cache.get(cache_key)
+
+    if rows is None:
+        rows = [list(row) for row in execute(POINT_SQL, [lon, lat] + sets,
+            sets=sets_clause(sets))]
+
+        if POINT_CACHE_TIMEOUT:
+            cache.set(cache_key, rows, POINT_CACHE_TIMEOUT)
+
+    return {
+        'point': [lat, lon],
+        'fields': POINT_FIELDS,
+        'objects': rows,
+    }
+
+
+BATCH_SQL = """
+    SELECT p.idx, s.slug, b.slug, b.kind, b.name, b.display_name,
+        b.external_id
+    FROM (VALUES %(values)s) AS p (idx, lon, lat)
+    JOIN %(boundary)s b
+        ON ST_Contains(b.shape, ST_SetSRID(ST_MakePoint(p.lon, p.lat),
+                                           %(srid)i))
+    JOIN %(boundaryset)s s ON s.id = b.set_id
+    WHERE s.live
+    %(sets)s
+    ORDER BY p.idx, b.kind, b.display_name
+"""
+
+
+@lookup_view
+def batch(request):
+    """
+    List the boundaries containing each of many points, given as
+    ?points=lat,lon|lat,lon|... (which may also be POSTed), in one query.
+    """
+    points = request.POST.get('points') or request.GET.get('points', '')
+    points = [parse_point(p) for p in points.split('|') if p]
+
+    if not points:
+        raise bad_request("Please provide 'points' as 'lat,lon|lat,lon|...'.")
+
+    if len(points) > MAX_BATCH_POINTS:
+        raise bad_request(
+            'At most %i points may be looked up at once.' % MAX_BATCH_POINTS)
+
+    sets = parse_sets(request)
+
+    values = ', '.join(['(%s, %s, %s)'] * len(points))
+    params = []
+
+    for i, (lon, lat) in enumerate(points):
+        params.extend([i, lon, lat])
+
+    rows = execute(BATCH_SQL, params + sets, values=values,
+        sets=sets_clause(sets))
+
+    results = [[] for point in points]
+
+    for row in rows:
+        results[row[0]].append(boundary_row(row[1:]))
+
+    return {'objects': [{
+        'point': [lat, lon],
+        'boundaries': boundaries
+        } for (lon, lat), boundaries in zip(points, results)]}
+
+
+DETAIL_SQL = """
+    SELECT b.slug, s.slug, b.kind, b.name, b.display_name, b.external_id,
+        b.metadata, %(centroid)s, %(shape)s
+    FROM %(boundary)s b
+    JOIN %(boundaryset)s s ON s.id = b.set_id
+    WHERE s.live
+    AND b.slug = %%s
+    LIMIT 1
+"""
+
+SHAPE_COLUMNS = {
+    'simple': 'b.simple_shape',
+    'full': 'b.shape',
+}
+
+
+def as_geojson(column):
+    """
+    SQL rendering a geometry column as GeoJSON, at the requested precision
+    (the first param) or else the set's.
+    """
+    return 'ST_AsGeoJSON(%s, COALESCE(%%s, s.precision, %i))' \
+        % (column, MAX_PRECISION)
+
+
+@lookup_view
+def detail(request, slug):
+    """
+    Get a boundary by its slug. Like the main API, ?shape_type= selects the
+    simple (default), full or no shape and ?precision= rounds coordinates.
+    """
+    shape_type = request.GET.get('shape_type', 'simple')
+    precision = parse_precision(request.GET.get('precision'))
+
+    params = [precision]
+
+    if shape_type in SHAPE_COLUMNS:
+        shape_sql = as_geojson(SHAPE_COLUMNS[shape_type])
+        params.append(precision)
+    else:
+        shape_sql = 'NULL'
+
+    rows = execute(DETAIL_SQL, params + [slug],
+        centroid=as_geojson('b.centroid'), shape=shape_sql)
+
+    if not rows:
+        raise ImmediateHttpResponse(response=http.HttpNotFound())
+
+    (slug, set_slug, kind, name, display_name, external_id, metadata,
+        centroid, shape) = rows[0]
+
+    data = {
+        'slug': slug,
+        'set': set_slug,
+        'kind': kind,
+        'name': name,
+        'display_name': display_name,
+        'external_id': external_id,
+        'metadata': json.loads(metadata) if metadata else None,
+        'centroid': json.loads(centroid) if centroid else None,
+    }
+
+    if shape_type == 'full':
+        data['shape'] = json.loads(shape) if shape else None
+    elif shape_type == 'simple':
+        data['simple_shape'] = json.loads(shape) if shape else None
+
+    return data
@@ -9,15 +9,25 @@ from tempfile import mkdtemp
 
 from django.conf import settings
 from django.contrib.gis.gdal import (CoordTransform, DataSource, OGRGeometry,
-                                     OGRGeomType)
-from django.core.management.base import BaseCommand
-from django.db import connections, DEFAULT_DB_ALIAS, transaction
+                                     OGRGeomType, SpatialReference)
+from django.contrib.gis.geos import Polygon
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.db.models import Q
 
-from boundaryservice.models import BoundarySet, Boundary
+from boundaryservice.models import BoundarySet, Boundary, BoundaryChange
+from boundaryservice.routers import mark_loaded
+from boundaryservice.utils import AttributeTable, map_namer
 
 DEFAULT_SHAPEFILES_DIR = getattr(settings, 'SHAPEFILES_DIR', 'data/shapefiles')
 GEOMETRY_COLUMN = 'shape'
 
+# Areas and perimeters are measured in a Lambert azimuthal equal-area
+# projection centered on each boundary, which keeps length distortion small
+# for anything up to the size of a large state.
+EQUAL_AREA_PROJ4 = ('+proj=laea +lat_0=%f +lon_0=%f +x_0=0 +y_0=0 '
+                    '+ellps=GRS80 +units=m +no_defs')
+
 
 class Command(BaseCommand):
     help = 'Import boundaries described by shapefiles.'
@@ -34,8 +44,11 @@ class Command(BaseCommand):
                     default=False,
                     help='Only load these kinds of Areas, comma-delimited.'),
         make_option('-u', '--database', action='store', dest='database',
-                    default=DEFAULT_DB_ALIAS,
+                    default=router.db_for_write(BoundarySet),
                     help='Specify a database to load shape data into.'),
+        make_option('-s', '--staged', action='store_true', dest='staged',
+            help='Load each set into a staged copy and swap it for the live '
+                 'set once it is complete, so readers are never affected.'),
     )
 
     def get_version(self):
@@ -67,22 +80,37 @@ class Command(BaseCommand):
 
             log.info('Processing %s.' % kind)
 
-            self.load_set(kind, config, options)
+            if options['staged']:
+                self.load_set_staged(kind, config, options)
+            else:
+                # The transaction must be on the database being loaded, so
+                # that its readers see either the old set or the new one
+                with transaction.commit_on_success(using=options['database']):
+                    self.load_set(kind, config, options)
+
+            mark_loaded()
 
-    @transaction.commit_on_success
     def load_set(self, kind, config, options):
         log.info('Processing %s.' % kind)
+        database = options['database']
+
+        # What the boundaries were before, to log what changed
+        old_digests = {}
+        version = 1
 
         if options['clear']:
             bset = None
 
             try:
-                bset = BoundarySet.objects.get(name=kind)
+                bset = BoundarySet.objects.using(database).get(name=kind)
 
                 if bset:
+                    old_digests = self.get_digests(bset, database)
+                    version = bset.version + 1
+
                     log.info('Clearing old %s.' % kind)
-                    bset.boundaries.all().delete()
-                    bset.delete()
+                    Boundary.objects.using(database).filter(set=bset).delete()
+                    bset.delete(using=database)
 
                     log.info('Loading new %s.' % kind)
             except BoundarySet.DoesNotExist:
@@ -92,11 +120,101 @@ class Command(BaseCommand):
         path = os.path.join(options['data_dir'], config['file'])
         datasources = create_datasources(path)
 
+        bset = self.create_set(kind, config, datasources, database,
+            version=version)
+        self.add_boundaries(kind, config, datasources, bset, database)
+
+        self.log_changes(bset, old_digests, self.get_digests(bset, database),
+            database)
+
+    def load_set_staged(self, kind, config, options):
+        """
+        Load a set without touching the live one: the boundaries are loaded
+        into a staged set which is not served, checked, and then swapped for
+        the live set by a short transaction. The replaced set is deleted
+        afterwards, while the new one is already being served.
+        """
+        database = options['database']
+
+        # Clean up after earlier loads which were interrupted while deleting
+        # the sets they replaced
+        for retired_set in BoundarySet.objects.using(database).filter(
+                live=False, retired=True):
+            self.delete_set(retired_set, database)
+
+        try:
+            live_set = BoundarySet.objects.using(database).get(name=kind)
+        except BoundarySet.DoesNotExist:
+            live_set = None
+
+        path = os.path.join(options['data_dir'], config['file'])
+        datasources = create_datasources(path)
+
+        with transaction.commit_on_success(using=database):
+            if live_set is not None:
+                slug = live_set.slug
+                version = live_set.version + 1
+            else:
+                new_set = BoundarySet(name=kind)
+                new_set.unique_slug(using=database)
+                slug = new_set.slug
+                version = 1
+
+            bset = self.create_set(kind, config, datasources, database,
+                name=shadow_name(kind, 'staged'), slug=slug, live=False,
+                version=version)
+
+            # Boundary slugs need only be unique among the boundaries which
+            # will be served alongside the new ones. The new set takes over
+            # the slugs of the one it replaces, so those needn't be avoided.
+            slug_queryset = Boundary.objects.using(database).filter(
+                Q(set__live=True) | Q(set=bset))
+
+            if live_set is not None:
+                slug_queryset = slug_queryset.exclude(set=live_set)
+            self.add_boundaries(kind, config, datasources, bset, database,
+                slug_queryset)
+
+            expected_count = sum(len(datasource[0])
+                                 for datasource in datasources)
+
+            if not expected_count or bset.count != expected_count:
+                raise CommandError('Staged %s has %i boundaries, but %i '
+                    'features were read. The live set was left in place.'
+                    % (kind, bset.count, expected_count))
+
+        if live_set is not None:
+            old_digests = self.get_digests(live_set, database)
+        else:
+            old_digests = {}
+
+        new_digests = self.get_digests(bset, database)
+
+        log.info('Swapping in new %s.' % kind)
+
+        with transaction.commit_on_success(using=database):
+            # The changes are logged as the new set goes live
+            self.log_changes(bset, old_digests, new_digests, database)
+
+            if live_set is not None:
+                BoundarySet.objects.using(database).filter(
+                    pk=live_set.pk).update(live=False, retired=True,
+                    name=shadow_name(kind, 'retired %i' % live_set.pk))
+
+            BoundarySet.objects.using(database).filter(pk=bset.pk).update(
+                live=True, name=kind)
+
+        if live_set is not None:
+            self.delete_set(live_set, database)
+
+    def create_set(self, kind, config, datasources, database, **kwargs):
+        """
+        Create a BoundarySet for a definition. Keyword arguments override the
+        values of its fields.
+        """
         layer = datasources[0][0]
 
-        # Create BoundarySet
-        log.info("Creating BoundarySet: %s" % kind)
-        bset = BoundarySet.objects.create(
+        fields = dict(
             name=kind,
             singular=config['singular'],
             kind_first=config['kind_first'],
@@ -106,10 +224,20 @@ class Command(BaseCommand):
             href=config['href'],
             notes=config['notes'],
             count=0,
-            metadata_fields=layer.fields
+            metadata_fields=layer.fields,
+            precision=config.get('precision')
         )
+        fields.update(kwargs)
+
+        # Create BoundarySet
+        log.info("Creating BoundarySet: %s" % fields['name'])
+        bset = BoundarySet.objects.using(database).create(**fields)
         log.info("Created with slug %s and id %s" % (bset.slug, bset.id))
-        
+
+        return bset
+
+    def add_boundaries(self, kind, config, datasources, bset, database,
+                       slug_queryset=None):
         for datasource in datasources:
             log.info("Loading %s from %s" % (kind, datasource.name))
             # Assume only a single-layer in shapefile
@@ -117,13 +245,156 @@ class Command(BaseCommand):
                 log.warn('%s shapefile [%s] has multiple layers, using first.'
                          % (datasource.name, kind))
             layer = datasource[0]
-            self.add_boundaries_for_layer(config, layer, bset,
-                                          options['database'])
+            self.add_boundaries_for_layer(config, layer, bset, database,
+                                          slug_queryset)
         # sync this with reality
-        bset.count = Boundary.objects.filter(set=bset).count()
-        bset.save()
+        boundaries = Boundary.objects.using(database).filter(set=bset)
+        bset.count = boundaries.count()
         log.info('%s count: %i' % (kind, bset.count))
 
+        self.add_set_geometry(config, bset, boundaries)
+        bset.save(using=database)
+
+    def add_set_geometry(self, config, bset, boundaries):
+        """
+        Compute the extent of a set and the outline of all its boundaries,
+        so clients needn't fetch and union every boundary themselves.
+        """
+        if not bset.count:
+            return
+
+        log.info('Computing outline of %s.' % bset.name)
+
+        bset.extent = Polygon.from_bbox(boundaries.extent(field_name='shape'))
+        bset.extent.srid = boundaries.model._meta.get_field('shape').srid
+
+        # The boundaries' simple shapes are dissolved into one outline, which
+        # is simplified again to smooth over slivers where separately
+        # simplified edges no longer meet exactly
+        union = boundaries.unionagg(field_name='simple_shape')
+        simple_union = union.simplify(config.get('simplification', 0.0001),
+                                      preserve_topology=True)
+
+        try:
+            bset.simple_shape = self.polygon_to_multipolygon(
+                simple_union.ogr).wkt
+        except ValueError:
+            log.warn('Outline of %s is not polygonal, skipping it.'
+                     % bset.name)
+
+    def get_digests(self, bset, database):
+        """
+        Get the external id, slug and a digest of the shape, name and
+        metadata of each of a set's boundaries, keyed by external id. The
+        digests are computed in the database so the shapes needn't be
+        fetched.
+
+        Boundaries which share an external id are told apart by their slug
+        as well.
+        """
+        boundaries = Boundary.objects.using(database).filter(set=bset).extra(
+            select={'digest': "md5(encode(ST_AsBinary(shape), 'hex') || "
+                              "name || metadata)"})
+        rows = list(boundaries.values_list('external_id', 'slug', 'digest'))
+
+        counts = {}
+
+        for external_id, slug, digest in rows:
+            counts[external_id] = counts.get(external_id, 0) + 1
+
+        duplicates = set(external_id for external_id, count in counts.items()
+                         if count > 1)
+
+        if duplicates:
+            log.warn('%i external ids are shared by more than one boundary in '
+                     '%s; those boundaries are matched across loads by slug '
+                     'as well.' % (len(duplicates), bset.slug))
+
+        digests = {}
+
+        for external_id, slug, digest in rows:
+            if external_id in duplicates:
+                key = (external_id, slug)
+            else:
+                key = external_id
+
+            digests[key] = (external_id, slug, digest)
+
+        return digests
+
+    def log_changes(self, bset, old_digests, new_digests, database,
+                    batch_size=1000):
+        """
+        Append the boundaries created, updated and deleted by loading a set
+        to the change log, matching them up by external id.
+        """
+        changes = []
+
+        def change(action, slug, external_id):
+            changes.append(BoundaryChange(set_slug=bset.slug,
+                set_version=bset.version, slug=slug, external_id=external_id,
+                action=action))
+
+        for key, (external_id, slug, digest) in new_digests.items():
+            if key not in old_digests:
+                change(BoundaryChange.CREATED, slug, external_id)
+            elif old_digests[key][2] != digest:
+                change(BoundaryChange.UPDATED, slug, external_id)
+
+        for key, (external_id, slug, digest) in old_digests.items():
+            if key not in new_digests:
+                change(BoundaryChange.DELETED, slug, external_id)
+
+        log.info('%s version %i: %i boundaries changed.'
+                 % (bset.slug, bset.version, len(changes)))
+
+        if changes:
+            self.lock_change_log(database)
+
+        for i in xrange(0, len(changes), batch_size):
+            BoundaryChange.objects.using(database).bulk_create(
+                changes[i:i + batch_size])
+
+    def lock_change_log(self, database):
+        """
+        Keep other loads from writing to the change log until this one's
+        transaction commits. Versions come from a sequence but only become
+        visible on commit, so without this a load committing after another
+        could add versions below ones consumers have already read past.
+        The log can still be read meanwhile.
+        """
+        connection = connections[database]
+
+        if connection.vendor != 'postgresql':
+            return
+
+        cursor = connection.cursor()
+        cursor.execute('LOCK TABLE %s IN EXCLUSIVE MODE'
+            % connection.ops.quote_name(BoundaryChange._meta.db_table))
+
+    def delete_set(self, bset, database, batch_size=1000):
+        """
+        Delete a set which is no longer live, a batch of boundaries at a time
+        so that no one transaction holds many locks.
+        """
+        log.info('Deleting old %s.' % bset.name)
+
+        boundaries = Boundary.objects.using(database).filter(set=bset)
+
+        while True:
+            ids = list(boundaries.values_list('id', flat=True)[:batch_size])
+
+            if not ids:
+                break
+
+            with transaction.commit_on_success(using=database):
+                # Only ids are needed to delete, not the shapes
+                Boundary.objects.using(database).filter(id__in=ids).only(
+                    'id').delete()
+
+        with transaction.commit_on_success(using=database):
+            BoundarySet.objects.using(database).filter(pk=bset.pk).delete()
+
     def polygon_to_multipolygon(self, geom):
         """
         Convert polygons to multipolygons so all features are homogenous in the
@@ -138,7 +409,21 @@ class Command(BaseCommand):
         else:
             raise ValueError('Geom is neither Polygon nor MultiPolygon.')
 
-    def add_boundaries_for_layer(self, config, layer, bset, database):
+    def measure(self, geometry, db_srs, center):
+        """
+        Return the area (in square meters) and perimeter (in meters) of an
+        OGR geometry in the database SRS.
+        """
+        equal_area_srs = SpatialReference(
+            EQUAL_AREA_PROJ4 % (center.y, center.x))
+
+        projected = geometry.clone()
+        projected.transform(CoordTransform(db_srs, equal_area_srs))
+
+        return projected.area, projected.geos.length
+
+    def add_boundaries_for_layer(self, config, layer, bset, database,
+                                 slug_queryset=None):
         # Get spatial reference system for the postgis geometry field
         geometry_field = Boundary._meta.get_field_by_name(GEOMETRY_COLUMN)[0]
         SpatialRefSys = connections[database].ops.spatial_ref_sys()
@@ -146,7 +431,8 @@ class Command(BaseCommand):
             srid=geometry_field.srid).srs
 
         if 'srid' in config and config['srid']:
-            layer_srs = SpatialRefSys.objects.get(srid=config['srid']).srs
+            layer_srs = SpatialRefSys.objects.using(database).get(
+                srid=config['srid']).srs
         else:
             layer_srs = layer.srs
 
@@ -160,52 +446,51 @@ class Command(BaseCommand):
         # Create a convertor to turn the source data into
         transformer = CoordTransform(layer_srs, db_srs)
 
-        for feature in layer:
+        # Read the attributes of all features up front, a column at a time,
+        # and name them all at once where the ider and namer allow it
+        table = AttributeTable(layer)
+        encoding = config['encoding']
+        metadata_rows = table.rows(encoding)
+        external_ids = self.map_names(config['ider'], table, encoding)
+        feature_names = self.map_names(config['namer'], table, encoding)
+
+        for i, feature in enumerate(layer):
             log.debug("Processing boundary %s" % feature)
             # Transform the geometry to the correct SRS
             geometry = self.polygon_to_multipolygon(feature.geom)
             geometry.transform(transformer)
+            geos = geometry.geos
+            centroid = geos.centroid
 
             # Preserve topology prevents a shape from ever crossing over
             # itself.
-            simple_geometry = geometry.geos.simplify(simplification,
-                                                     preserve_topology=True)
+            simple_geometry = geos.simplify(simplification,
+                                            preserve_topology=True)
+            simple_vertex_count = simple_geometry.num_coords
 
             # Conversion may force multipolygons back to being polygons
             simple_geometry = self.polygon_to_multipolygon(simple_geometry.ogr)
 
-            # Extract metadata into a dictionary
-            metadata = {}
+            metadata = metadata_rows[i]
 
-            for field in layer.fields:
-
-                # Decode string fields using encoding specified in definitions
-                # config
-                if config['encoding'] != '':
-                    try:
-                        metadata[field] = feature.get(field).decode(
-                            config['encoding'])
-                    # Only strings will be decoded, get value in normal way if
-                    # int etc.
-                    except AttributeError:
-                        metadata[field] = feature.get(field)
-                else:
-                    metadata[field] = feature.get(field)
-
-            external_id = config['ider'](feature)
-            feature_name = config['namer'](feature)
+            if external_ids is not None:
+                external_id = external_ids[i]
+            else:
+                external_id = self.decode(config['ider'](feature), encoding)
 
-            # If encoding is specified, decode id and feature name
-            if config['encoding'] != '':
-                external_id = external_id.decode(config['encoding'])
-                feature_name = feature_name.decode(config['encoding'])
+            if feature_names is not None:
+                feature_name = feature_names[i]
+            else:
+                feature_name = self.decode(config['namer'](feature), encoding)
 
             if config['kind_first']:
                 display_name = '%s %s' % (config['singular'], feature_name)
             else:
                 display_name = '%s %s' % (feature_name, config['singular'])
 
-            Boundary.objects.create(
+            area, perimeter = self.measure(geometry, db_srs, centroid)
+
+            boundary = Boundary(
                 set=bset,
                 kind=config['singular'],
                 external_id=external_id,
@@ -214,7 +499,47 @@ class Command(BaseCommand):
                 metadata=metadata,
                 shape=geometry.wkt,
                 simple_shape=simple_geometry.wkt,
-                centroid=geometry.geos.centroid)
+                centroid=centroid,
+                label_point=geos.point_on_surface,
+                extent=geos.envelope,
+                area=area,
+                perimeter=perimeter,
+                vertex_count=geos.num_coords,
+                simple_vertex_count=simple_vertex_count)
+
+            if slug_queryset is not None:
+                boundary.unique_slug(queryset=slug_queryset)
+
+            boundary.save(using=database, force_insert=True)
+
+    def map_names(self, namer, table, encoding):
+        """
+        Name every feature in the table at once, decoding the names if an
+        encoding is specified. Returns None if the namer can only name one
+        feature at a time.
+        """
+        names = map_namer(namer, table)
+
+        if names is not None and encoding != '':
+            names = [name.decode(encoding) for name in names]
+
+        return names
+
+    def decode(self, name, encoding):
+        if encoding != '':
+            return name.decode(encoding)
+
+        return name
+
+def shadow_name(kind, label):
+    """
+    Name a set which is not live, e.g. "Wards (staged)", keeping within the
+    length of BoundarySet.name.
+    """
+    suffix = ' (%s)' % label
+    max_length = BoundarySet._meta.get_field('name').max_length
+
+    return kind[:max_length - len(suffix)] + suffix
 
 def create_datasources(path):
     if path.endswith('.zip'):
@@ -82,6 +82,9 @@ SHAPEFILES = {
         # column for this shapefile, larger numbers create polygons with fewer
         # points.
         'simplification': 0.0001,
+        # Number of decimal places to round coordinates to in API responses, unless a request asks
+        # for a different ?precision=. Leave undefined or set to None to return full precision
+        'precision': None,
     }
 }
 """
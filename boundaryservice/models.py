@@ -17,13 +17,15 @@ class SluggedModel(models.Model):
         abstract = True
     
     def save(self, *args, **kwargs):
-        self.unique_slug()  
+        self.unique_slug(using=kwargs.get('using'))
         if self.slug == '': raise ValueError, "Slug may not be blank [%s]" % str(self)
         super(SluggedModel,self).save(*args, **kwargs)
 
-    def unique_slug(self):
+    def unique_slug(self, using=None, queryset=None):
         """
-        Customized unique_slug function
+        Customized unique_slug function. Uniqueness is checked among the
+        objects in queryset, by default all objects in the database being
+        saved to.
         """
         if not getattr(self, "slug"): # if it's already got a slug, do nothing.
             from django.template.defaultfilters import slugify
@@ -36,7 +38,8 @@ class SluggedModel(models.Model):
             else:
                 return
             original_slug = slugify(slug_txt)
-            queryset = self.__class__._default_manager.all()
+            if queryset is None:
+                queryset = self.__class__._default_manager.db_manager(using).all()
             if not queryset.filter(slug=original_slug).count():
                 setattr(self, "slug", original_slug)
             else:
@@ -79,6 +82,22 @@ class BoundarySet(SluggedModel):
         help_text='Total number of features in this boundary set.')
     metadata_fields = ListField(separator='|', blank=True,
         help_text='What, if any, metadata fields were loaded from the original dataset.')
+    live = models.BooleanField(default=True, db_index=True,
+        help_text='Whether this set is served by the API. Sets are not live while they are staged for a reload, or once they have been replaced.')
+    retired = models.BooleanField(default=False,
+        help_text='Whether this set has been replaced by a reload and is waiting to be deleted.')
+    precision = models.IntegerField(null=True, blank=True,
+        help_text='Default number of decimal places for coordinates in API responses, if they should be rounded.')
+    simple_shape = models.MultiPolygonField(srid=4269,
+        null=True,
+        help_text='The union of all boundaries in this set (the outline of the whole set) in EPSG:4269 projection, simplified like the boundaries\' simple_shape.')
+    extent = models.PolygonField(srid=4269,
+        null=True,
+        help_text='The bounding box of all boundaries in this set in EPSG:4269 projection.')
+    version = models.IntegerField(default=1,
+        help_text='How many times this set has been loaded; incremented each time it is reloaded.')
+
+    objects = models.GeoManager()
 
     class Meta:
         ordering = ('name',)
@@ -89,6 +108,12 @@ class BoundarySet(SluggedModel):
         """
         return unicode(self.name)
 
+    def get_precision(self):
+        """
+        Default number of decimal places for this set's coordinates.
+        """
+        return self.precision
+
 
 class Boundary(SluggedModel):
     """
@@ -113,7 +138,21 @@ class Boundary(SluggedModel):
     centroid = models.PointField(srid=4269,
         null=True,
         help_text='The centroid (weighted center) of this boundary in EPSG:4269 projection.')
-    
+    label_point = models.PointField(srid=4269,
+        null=True,
+        help_text='A point guaranteed to lie inside this boundary, for placing labels, in EPSG:4269 projection.')
+    extent = models.PolygonField(srid=4269,
+        null=True,
+        help_text='The bounding box (envelope) of this boundary in EPSG:4269 projection.')
+    area = models.FloatField(null=True, db_index=True,
+        help_text='The area of this boundary in square meters, measured in an equal-area projection.')
+    perimeter = models.FloatField(null=True, db_index=True,
+        help_text='The length of the outline of this boundary in meters, measured in the same projection as area.')
+    vertex_count = models.IntegerField(null=True, db_index=True,
+        help_text='The number of vertices in shape.')
+    simple_vertex_count = models.IntegerField(null=True, db_index=True,
+        help_text='The number of vertices in simple_shape.')
+
     objects = models.GeoManager()
 
     class Meta:
@@ -126,3 +165,47 @@ class Boundary(SluggedModel):
         and will slug like "austin-community-area".
         """
         return unicode(self.display_name)
+
+    def get_precision(self):
+        """
+        Default number of decimal places for this boundary's coordinates.
+        """
+        return self.set.precision
+
+
+class BoundaryChange(models.Model):
+    """
+    An entry in the append-only log of boundaries created, updated or
+    deleted by loading shapefiles. Boundaries are matched across loads by
+    their set and external id.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+
+    ACTIONS = (
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+    )
+
+    version = models.AutoField(primary_key=True,
+        help_text='The position of this change in the log; later changes have higher versions.')
+    set_slug = models.CharField(max_length=256, db_index=True,
+        help_text='The slug of the set the boundary belongs to.')
+    set_version = models.IntegerField(
+        help_text='The version of the set which was loaded.')
+    slug = models.CharField(max_length=256,
+        help_text='The slug of the boundary; for deleted boundaries, the slug it had.')
+    external_id = models.CharField(max_length=64,
+        help_text='The boundary\'s unique id in the source dataset.')
+    action = models.CharField(max_length=16, choices=ACTIONS,
+        help_text='Whether the boundary was created, updated or deleted.')
+    created_at = models.DateTimeField(auto_now_add=True,
+        help_text='When the change was made.')
+
+    class Meta:
+        ordering = ('version',)
+
+    def __unicode__(self):
+        return u'%s %s %s' % (self.action, self.set_slug, self.external_id)
@@ -0,0 +1,220 @@
+import base64
+import json
+import re
+from urllib import urlencode
+
+from django.conf import settings
+from django.db import connections
+from tastypie.exceptions import BadRequest
+from tastypie.paginator import Paginator
+
+# How to report total_count when the client doesn't ask: 'exact', 'estimate'
+# or 'none'
+DEFAULT_COUNT = getattr(settings, 'BOUNDARY_SERVICE_COUNT', 'exact')
+
+
+class KeysetPaginator(Paginator):
+    """
+    Paginator which pages through a QuerySet by the values of its ordering
+    key, rather than by skipping over an offset, so that deep pages are as
+    fast as the first one. The key is the model's default ordering plus its
+    primary key, which should be covered by a single index.
+
+    Pages are requested with an opaque ``after`` cursor, which the ``next``
+    link carries. Clients asking for an explicit ``offset`` or ``order_by``
+    get plain offset pagination, as before.
+
+    The ``total_count`` parameter selects how the total is reported:
+    ``exact`` (a full COUNT), ``estimate`` (the query planner's estimate) or
+    ``none`` (not at all).
+    """
+    def get_keyset(self):
+        """
+        Get the names of the fields to page by, or None if this page must
+        use offset pagination.
+        """
+        for key in ('offset', 'order_by', 'sort_by'):
+            if key in self.request_data:
+                return None
+
+        if not hasattr(self.objects, 'model'):
+            return None
+
+        ordering = list(self.objects.model._meta.ordering)
+
+        # Row comparison only works for ascending, local fields
+        for field_name in ordering:
+            if field_name.startswith('-') or '__' in field_name:
+                return None
+
+        pk_name = self.objects.model._meta.pk.name
+
+        if pk_name in ordering:
+            return ordering
+
+        return ordering + [pk_name]
+
+    def get_cursor(self):
+        """
+        Decode the ``after`` cursor, if one was given.
+        """
+        cursor = self.request_data.get('after')
+
+        if not cursor:
+            return None
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        except (TypeError, ValueError, UnicodeError):
+            raise BadRequest("Invalid cursor provided.")
+
+        if not isinstance(cursor, list):
+            raise BadRequest("Invalid cursor provided.")
+
+        return cursor
+
+    def encode_cursor(self, obj, keyset):
+        return base64.urlsafe_b64encode(
+            json.dumps([getattr(obj, field_name) for field_name in keyset]))
+
+    def get_keyset_slice(self, keyset, cursor):
+        """
+        Order the QuerySet by the key and skip past the cursor, using a row
+        comparison so the database can walk the index.
+        """
+        objects = self.objects.order_by(*keyset)
+
+        if cursor is None:
+            return objects
+
+        if len(cursor) != len(keyset):
+            raise BadRequest("Invalid cursor provided.")
+
+        opts = self.objects.model._meta
+        qn = connections[self.objects.db].ops.quote_name
+        columns = ['%s.%s' % (qn(opts.db_table), qn(opts.get_field(f).column))
+            for f in keyset]
+
+        where = '(%s) > (%s)' % (', '.join(columns),
+            ', '.join(['%s'] * len(columns)))
+
+        return objects.extra(where=[where], params=cursor)
+
+    def get_count(self):
+        """
+        Count the objects exactly, estimate their number or skip counting,
+        as requested.
+        """
+        mode = self.request_data.get('total_count', DEFAULT_COUNT)
+
+        if mode == 'none':
+            return None
+
+        if mode == 'estimate':
+            estimate = self.get_estimated_count()
+
+            if estimate is not None:
+                return estimate
+        elif mode != 'exact':
+            raise BadRequest("Invalid total_count '%s' provided. Please provide 'exact', 'estimate' or 'none'." % mode)
+
+        return super(KeysetPaginator, self).get_count()
+
+    def get_estimated_count(self):
+        """
+        Ask PostgreSQL's planner how many rows the query will return. Returns
+        None if that isn't possible.
+        """
+        if not hasattr(self.objects, 'query'):
+            return None
+
+        connection = connections[self.objects.db]
+
+        if connection.vendor != 'postgresql':
+            return None
+
+        sql, params = self.objects.query.get_compiler(self.objects.db).as_sql()
+
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN %s' % sql, params)
+        plan = cursor.fetchone()[0]
+
+        match = re.search(r'rows=(\d+)', plan)
+
+        if not match:
+            return None
+
+        return int(match.group(1))
+
+    def _generate_cursor_uri(self, limit, cursor):
+        if self.resource_uri is None:
+            return None
+
+        request_params = self.request_data.copy()
+
+        for key in ('limit', 'offset', 'after'):
+            if key in request_params:
+                del request_params[key]
+
+        request_params.update({'limit': limit, 'after': cursor})
+
+        try:
+            # QueryDict can handle multiple values for the same key
+            encoded_params = request_params.urlencode()
+        except AttributeError:
+            encoded_params = urlencode(dict(
+                (k, v.encode('utf-8') if isinstance(v, unicode) else v)
+                for k, v in request_params.items()))
+
+        return '%s?%s' % (self.resource_uri, encoded_params)
+
+    def page(self):
+        """
+        Generate the requested page. One more object than the limit is
+        fetched to tell whether there is a next page, so no count is needed
+        for the links.
+        """
+        limit = self.get_limit()
+        keyset = self.get_keyset()
+
+        if keyset:
+            objects = self.get_keyset_slice(keyset, self.get_cursor())
+            offset = 0
+        else:
+            objects = self.objects
+            offset = self.get_offset()
+
+        meta = {
+            'limit': limit,
+            'total_count': self.get_count(),
+        }
+
+        if not limit:
+            objects = objects[offset:]
+            has_next = False
+        else:
+            objects = list(objects[offset:offset + limit + 1])
+            has_next = len(objects) > limit
+            objects = objects[:limit]
+
+        if keyset:
+            meta['previous'] = None
+            meta['next'] = None
+
+            if has_next:
+                meta['next'] = self._generate_cursor_uri(limit,
+                    self.encode_cursor(objects[-1], keyset))
+        else:
+            meta['offset'] = offset
+
+            if limit:
+                meta['previous'] = self.get_previous(limit, offset)
+                meta['next'] = None
+
+                if has_next:
+                    meta['next'] = self._generate_uri(limit, offset + limit)
+
+        return {
+            self.collection_name: objects,
+            'meta': meta,
+        }
@@ -1,15 +1,20 @@
 import re
 
 from django.conf import settings
+from django.conf.urls.defaults import url
 from django.contrib.gis.measure import D
 from tastypie import fields
-from tastypie.serializers import Serializer
 from tastypie.constants import ALL, ALL_WITH_RELATIONS
+from tastypie.exceptions import BadRequest
+from tastypie.resources import ModelResource
+from tastypie.utils import trailing_slash
 from django.contrib.gis.geos import Polygon
 
 from boundaryservice.authentication import NoOpApiKeyAuthentication
-from boundaryservice.models import BoundarySet, Boundary
-from boundaryservice.tastyhacks import SluggedResource
+from boundaryservice.models import BoundarySet, Boundary, BoundaryChange
+from boundaryservice.paginator import KeysetPaginator
+from boundaryservice.serializers import GeometrySerializer
+from boundaryservice.tastyhacks import GeometryApiField, SluggedResource
 from boundaryservice.throttle import AnonymousThrottle
 
 if getattr(settings, 'BOUNDARY_SERVICE_THROTTLE', False):
@@ -18,42 +23,179 @@ else:
     throttle_cls = False
 
 
+def set_shape_requested(request):
+    """
+    The outlines of sets are only loaded and returned when asked for with
+    ?shape_type=simple, as they can be large.
+    """
+    return request.GET.get('shape_type') == 'simple'
+
+
+def include_requested(request, field_name):
+    """
+    Whether a field was asked for with ?include=, e.g. ?include=boundaries.
+    """
+    return field_name in request.GET.get('include', '').split(',')
+
+
 class BoundarySetResource(SluggedResource):
+    # Listing every boundary of every set is expensive, so by default sets
+    # only link to their boundaries (see dehydrate)
     boundaries = fields.ToManyField(
-        'boundaryservice.resources.BoundaryResource', 'boundaries')
+        'boundaryservice.resources.BoundaryResource', 'boundaries',
+        use_in=lambda bundle: include_requested(bundle.request, 'boundaries'))
+    simple_shape = GeometryApiField('simple_shape', null=True,
+        use_in=lambda bundle: set_shape_requested(bundle.request))
 
     class Meta:
-        queryset = BoundarySet.objects.all()
-        serializer = Serializer(
-            formats=['json', 'jsonp'],
-            content_types={
-                'json': 'application/json',
-                'jsonp': 'text/javascript'})
+        queryset = BoundarySet.objects.filter(live=True)
+        serializer = GeometrySerializer()
         resource_name = 'boundary-set'
-        excludes = ['id', 'singular', 'kind_first']
+        excludes = ['id', 'singular', 'kind_first', 'live', 'retired',
+                    'precision']
         allowed_methods = ['get']
         authentication = NoOpApiKeyAuthentication()
         throttle = throttle_cls
+        paginator_class = KeysetPaginator
+
+    def get_object_list(self, request):
+        """
+        Leave the outlines of sets in the database unless they were asked
+        for.
+        """
+        object_list = super(BoundarySetResource, self).get_object_list(request)
+
+        if not set_shape_requested(request):
+            object_list = object_list.defer('simple_shape')
+
+        return object_list
+
+    def dehydrate(self, bundle):
+        """
+        Link to the list of this set's boundaries.
+        """
+        bundle.data['boundaries_uri'] = '%s?sets=%s' % (
+            self.get_boundary_list_uri(), bundle.obj.slug)
+
+        return bundle
+
+    def get_boundary_list_uri(self):
+        """
+        The URI of the list of boundaries. Building a resource is costly, so
+        it is only done once, rather than for every set.
+        """
+        if not hasattr(self, '_boundary_list_uri'):
+            self._boundary_list_uri = \
+                self.fields['boundaries'].to_class().get_resource_uri()
+
+        return self._boundary_list_uri
+
+    def override_urls(self):
+        """
+        Add endpoints for the label points of a set's boundaries and for
+        looking boundaries up by external id.
+        """
+        return [
+            url(r"^(?P<resource_name>%s)/(?P<slug>[\w\d_.-]+)/points%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('get_points'), name="api_get_points"),
+            url(r"^(?P<resource_name>%s)/(?P<slug>[\w\d_.-]+)/external-ids%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('get_external_ids'), name="api_get_external_ids"),
+            ] + super(BoundarySetResource, self).override_urls()
+
+    def get_points(self, request, **kwargs):
+        """
+        Return the slug, name, centroid and label point of every boundary in
+        a set. Only the precomputed point columns are read, so this is much
+        cheaper than listing the boundaries themselves.
+        """
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+
+        set_id = BoundarySet.objects.values_list('id', flat=True).get(
+            slug=kwargs['slug'], live=True)
+
+        points = Boundary.objects.filter(set=set_id).values_list(
+            'slug', 'name', 'centroid', 'label_point')
+
+        objects = [{
+            'slug': slug,
+            'name': name,
+            'centroid': point_coords(centroid),
+            'label_point': point_coords(label_point)
+            } for slug, name, centroid, label_point in points]
+
+        self.log_throttled_access(request)
+
+        return self.create_response(request, {
+            'meta': {'total_count': len(objects)},
+            'objects': objects})
+
+
+    def get_external_ids(self, request, **kwargs):
+        """
+        Map a comma-separated list of external ids (the ``ids`` parameter,
+        which may also be POSTed for long lists) to the boundaries in a set,
+        in a single query.
+        """
+        self.method_check(request, allowed=['get', 'post'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+
+        set_id = BoundarySet.objects.values_list('id', flat=True).get(
+            slug=kwargs['slug'], live=True)
+
+        ids = request.POST.get('ids') or request.GET.get('ids', '')
+        external_ids = [i for i in ids.split(',') if i]
+
+        if not external_ids:
+            raise BadRequest("Please provide a comma-separated list of 'ids'.")
+
+        boundaries = Boundary.objects.filter(set=set_id,
+            external_id__in=external_ids).values_list('external_id', 'slug',
+            'name').order_by('external_id', 'slug')
+
+        # Detail URIs are the list URI plus the slug
+        list_uri = self.get_boundary_list_uri()
+
+        # Several boundaries may share an external id; each gets a row
+        objects = [{
+            'external_id': external_id,
+            'slug': slug,
+            'name': name,
+            'resource_uri': '%s%s/' % (list_uri, slug)
+            } for external_id, slug, name in boundaries]
+
+        found = set(obj['external_id'] for obj in objects)
+
+        self.log_throttled_access(request)
+
+        return self.create_response(request, {
+            'meta': {
+                'total_count': len(objects),
+                'not_found': [i for i in external_ids if i not in found]},
+            'objects': objects})
 
 
 class BoundaryResource(SluggedResource):
     set = fields.ForeignKey(BoundarySetResource, 'set')
 
     class Meta:
-        queryset = Boundary.objects.all()
-        serializer = Serializer(
-            formats=['json', 'jsonp'],
-            content_types={
-                'json': 'application/json',
-                'jsonp': 'text/javascript'})
+        queryset = Boundary.objects.filter(set__live=True)
+        serializer = GeometrySerializer()
         resource_name = 'boundary'
         excludes = ['id', 'display_name']
         allowed_methods = ['get']
         authentication = NoOpApiKeyAuthentication()
         throttle = throttle_cls
+        paginator_class = KeysetPaginator
         filtering = {
-            "slug": ALL
+            "slug": ALL,
+            "area": ALL,
+            "perimeter": ALL,
+            "vertex_count": ALL,
+            "simple_vertex_count": ALL
         }
+        ordering = ['name', 'area', 'perimeter', 'vertex_count',
+                    'simple_vertex_count']
 
     def alter_list_data_to_serialize(self, request, data):
         """
@@ -118,7 +260,7 @@ class BoundaryResource(SluggedResource):
 
         if 'intersects' in filters:
             slug = filters['intersects']
-            bounds = Boundary.objects.get(slug=slug)
+            bounds = Boundary.objects.filter(set__live=True).get(slug=slug)
 
             orm_filters.update({'shape__intersects': bounds.shape})
 
@@ -130,3 +272,52 @@ class BoundaryResource(SluggedResource):
             orm_filters.update({'shape__intersects': bbox})
 
         return orm_filters
+
+
+class BoundaryChangeResource(ModelResource):
+    """
+    The log of changes made by loading shapefiles, oldest first. Consumers
+    keep the version of the last change they have seen and ask for what
+    came after it with ?since=<version>.
+    """
+    class Meta:
+        queryset = BoundaryChange.objects.all()
+        serializer = GeometrySerializer()
+        resource_name = 'boundary-change'
+        allowed_methods = ['get']
+        authentication = NoOpApiKeyAuthentication()
+        throttle = throttle_cls
+        paginator_class = KeysetPaginator
+        filtering = {
+            "set_slug": ALL,
+            "action": ALL,
+        }
+
+    def build_filters(self, filters=None):
+        """
+        Support ?since=<version> to list only later changes.
+        """
+        if filters is None:
+            filters = {}
+
+        orm_filters = super(BoundaryChangeResource, self).build_filters(filters)
+
+        if 'since' in filters:
+            try:
+                since = int(filters['since'])
+            except ValueError:
+                raise BadRequest("Invalid since '%s' provided. Please provide a version number." % filters['since'])
+
+            orm_filters.update({'version__gt': since})
+
+        return orm_filters
+
+
+def point_coords(point):
+    """
+    Represent a point as a bare [x, y] pair rather than a GeoJSON object.
+    """
+    if point is None:
+        return None
+
+    return [point.x, point.y]
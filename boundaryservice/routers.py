@@ -0,0 +1,102 @@
+"""
+Database routing for boundary data.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# Databases to spread reads across, e.g. a pool of replicas
+READ_DATABASES = getattr(settings, 'BOUNDARY_SERVICE_READ_DATABASES', [DEFAULT_DB_ALIAS])
+
+# The primary database, which the loader writes to
+WRITE_DATABASE = getattr(settings, 'BOUNDARY_SERVICE_WRITE_DATABASE', DEFAULT_DB_ALIAS)
+
+# For how many seconds after a load reads should go to the primary, so that
+# readers don't see stale data while the replicas catch up. 0 disables this.
+STICKY_READS = getattr(settings, 'BOUNDARY_SERVICE_STICKY_READS', 0)
+
+LAST_LOAD_CACHE_KEY = 'boundaryservice:last_load'
+
+
+def mark_loaded():
+    """
+    Record that boundaries were just loaded, so reads stick to the primary
+    for a while. The cache must be shared with the API servers.
+    """
+    if STICKY_READS:
+        cache.set(LAST_LOAD_CACHE_KEY, time.time(), STICKY_READS)
+
+
+class BoundaryServiceRouter(object):
+    """
+    Sends reads of boundary data to one of BOUNDARY_SERVICE_READ_DATABASES
+    and writes to BOUNDARY_SERVICE_WRITE_DATABASE. Enable it by adding it to
+    DATABASE_ROUTERS.
+    """
+    # Checking for a recent load costs a cache lookup, so the answer is
+    # reused for this many seconds
+    sticky_check_interval = 1
+
+    def __init__(self):
+        self._sticky = False
+        self._sticky_checked_at = 0
+
+    def is_sticky(self):
+        if not STICKY_READS:
+            return False
+
+        now = time.time()
+
+        if now - self._sticky_checked_at > self.sticky_check_interval:
+            self._sticky = cache.get(LAST_LOAD_CACHE_KEY) is not None
+            self._sticky_checked_at = now
+
+        return self._sticky
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'boundaryservice':
+            return None
+
+        instance_db = self.instance_db(hints)
+
+        if instance_db is not None:
+            return instance_db
+
+        if self.is_sticky():
+            return WRITE_DATABASE
+
+        return random.choice(READ_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != 'boundaryservice':
+            return None
+
+        instance_db = self.instance_db(hints)
+
+        if instance_db is not None:
+            return instance_db
+
+        return WRITE_DATABASE
+
+    def instance_db(self, hints):
+        """
+        The database an object came from, if the query concerns one, so that
+        e.g. the related objects of a set loaded into some database are
+        read and deleted there too.
+        """
+        instance = hints.get('instance')
+
+        if instance is not None:
+            return instance._state.db
+
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._meta.app_label == 'boundaryservice' and \
+                obj2._meta.app_label == 'boundaryservice':
+            return True
+
+        return None
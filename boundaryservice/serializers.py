@@ -0,0 +1,124 @@
+"""
+Serializers for boundary data.
+"""
+import json
+
+from django.contrib.gis.geos import GEOSGeometry
+from tastypie.bundle import Bundle
+from tastypie.serializers import Serializer
+
+from boundaryservice.tastyhacks import MAX_PRECISION
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import geobuf
+except ImportError:
+    geobuf = None
+
+
+class GeometrySerializer(Serializer):
+    """
+    Serializer which renders geometries according to the requested format:
+    GeoJSON for the text formats and WKB for the binary ones.
+
+    The binary formats are only offered when their libraries are installed:
+    'msgpack' (WKB geometries inside msgpack) requires msgpack-python and
+    'geobuf' requires geobuf.
+    """
+    formats = ['json', 'jsonp']
+    content_types = {
+        'json': 'application/json',
+        'jsonp': 'text/javascript',
+    }
+
+    if msgpack is not None:
+        formats.append('msgpack')
+        content_types['msgpack'] = 'application/x-msgpack'
+
+    if geobuf is not None:
+        formats.append('geobuf')
+        content_types['geobuf'] = 'application/x-protobuf'
+
+    # When encoding features, the first of these that is present becomes the
+    # feature's geometry; any other geometries are left in its properties.
+    feature_geometry_fields = ('shape', 'simple_shape', 'extent')
+
+    def to_simple(self, data, options):
+        """
+        Render geometries, which the GeometryApiField leaves untouched, and
+        make sure binary formats get text keys.
+        """
+        options = options or {}
+        binary = options.get('geometry_format') == 'wkb'
+
+        if isinstance(data, GEOSGeometry):
+            if binary:
+                # Written straight from the GEOS geometry; no text coordinates
+                # are formatted or parsed along the way
+                return str(data.wkb)
+
+            return json.loads(data.geojson)
+
+        if binary:
+            # Binary formats distinguish text from bytes, so dictionary keys
+            # must be text as well
+            if isinstance(data, Bundle):
+                data = data.data
+
+            if isinstance(data, dict):
+                return dict((unicode(key), self.to_simple(value, options))
+                    for key, value in data.iteritems())
+
+        return super(GeometrySerializer, self).to_simple(data, options)
+
+    def to_msgpack(self, data, options=None):
+        """
+        Serialize to msgpack, with geometries as WKB byte strings.
+        """
+        options = dict(options or {}, geometry_format='wkb')
+
+        return msgpack.packb(self.to_simple(data, options), use_bin_type=True)
+
+    def to_geobuf(self, data, options=None):
+        """
+        Serialize to Geobuf. Lists become a FeatureCollection (with the
+        list's meta as a custom property) and single objects a Feature.
+        """
+        options = options or {}
+        precision = options.get('precision', MAX_PRECISION)
+        data = self.to_simple(data, options)
+
+        if 'objects' in data:
+            collection = {
+                'type': 'FeatureCollection',
+                'features': [self.to_feature(obj) for obj in data['objects']],
+            }
+
+            if 'meta' in data:
+                collection['meta'] = data['meta']
+
+            return geobuf.encode(collection, precision)
+
+        return geobuf.encode(self.to_feature(data), precision)
+
+    def to_feature(self, obj):
+        """
+        Convert a simplified object into a GeoJSON Feature.
+        """
+        properties = dict(obj)
+        geometry = None
+
+        for field in self.feature_geometry_fields:
+            if properties.get(field) is not None:
+                geometry = properties.pop(field)
+                break
+
+        return {
+            'type': 'Feature',
+            'geometry': geometry,
+            'properties': properties,
+        }
@@ -0,0 +1,3 @@
+-- Covers Boundary's default ordering plus its primary key, which is the key
+-- KeysetPaginator pages through.
+CREATE INDEX boundaryservice_boundary_keyset ON boundaryservice_boundary (kind, display_name, id);
@@ -1,14 +1,41 @@
-import json
-
+from django.conf import settings
 from django.conf.urls.defaults import url
 from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.cache import cache
 
 from tastypie.bundle import Bundle
+from tastypie.exceptions import BadRequest
 from tastypie.fields import ApiField, CharField
 from tastypie.resources import ModelResource
 from tastypie.utils import trailing_slash
 
 from boundaryservice.fields import ListField, JSONField
+from boundaryservice.utils import quantize_geometry
+
+# Coordinates beyond 15 significant digits are noise anyway
+MAX_PRECISION = 15
+
+# How long to cache quantized geometries for, in seconds; 0 disables caching
+GEOMETRY_CACHE_TIMEOUT = getattr(settings, 'BOUNDARY_SERVICE_GEOMETRY_CACHE_TIMEOUT', 0)
+
+def parse_precision(value):
+    """
+    Parse a requested number of decimal places. Returns None if none was
+    given, so the default applies.
+    """
+    if not value:
+        return None
+
+    try:
+        precision = int(value)
+    except ValueError:
+        raise BadRequest('Precision must be an integer.')
+
+    if not 0 <= precision <= MAX_PRECISION:
+        raise BadRequest('Precision must be between 0 and %i.' % MAX_PRECISION)
+
+    return precision
 
 class ListApiField(ApiField):
     """
@@ -44,24 +71,69 @@ class JSONApiField(ApiField):
 
 class GeometryApiField(ApiField):
     """
-    Custom ApiField for dealing with data from GeometryFields (by serializing them as GeoJSON) .
+    Custom ApiField for dealing with data from GeometryFields.
+
+    Geometries are left as they are; the GeometrySerializer renders them as
+    GeoJSON or WKB depending on the requested format.
     """
     dehydrated_type = 'geometry'
     help_text = 'Geometry data.'
     
-    def dehydrate(self, obj):
-        return self.convert(super(GeometryApiField, self).dehydrate(obj))
+    def dehydrate(self, bundle):
+        value = self.convert(super(GeometryApiField, self).dehydrate(bundle))
+
+        if value is None:
+            return None
+
+        precision = self.get_precision(bundle)
+
+        if precision is None:
+            return value
+
+        return self.quantize(bundle.obj, value, precision)
     
     def convert(self, value):
         if value is None:
             return None
 
-        if isinstance(value, dict):
-            return value
+        return value
+
+    def get_precision(self, bundle):
+        """
+        Get the number of decimal places requested with ?precision=, falling
+        back to the object's own default, if it has one.
+        """
+        precision = None
+
+        if bundle.request is not None:
+            precision = parse_precision(bundle.request.GET.get('precision'))
 
-        # Get ready-made geojson serialization and then convert it _back_ to a Python object
-        # so that Tastypie can serialize it as part of the bundle
-        return json.loads(value.geojson)
+        if precision is None and hasattr(bundle.obj, 'get_precision'):
+            return bundle.obj.get_precision()
+
+        return precision
+
+    def quantize(self, obj, geometry, precision):
+        """
+        Quantize a geometry, reusing a cached copy when caching of quantized
+        geometries is enabled. Entries are keyed on the object's primary key,
+        which changes whenever a set is reloaded.
+        """
+        if not GEOMETRY_CACHE_TIMEOUT:
+            return quantize_geometry(geometry, precision)
+
+        key = 'boundaryservice:quantized:%s:%s:%s:%i' % (
+            obj.__class__.__name__.lower(), obj.pk, self.attribute, precision)
+
+        hexewkb = cache.get(key)
+
+        if hexewkb is not None:
+            return GEOSGeometry(hexewkb)
+
+        quantized = quantize_geometry(geometry, precision)
+        cache.set(key, quantized.hexewkb, GEOMETRY_CACHE_TIMEOUT)
+
+        return quantized
 
 
 class SluggedResource(ModelResource):
@@ -101,6 +173,44 @@ class SluggedResource(ModelResource):
         
         return self._build_reverse_url("api_dispatch_detail", kwargs=kwargs)
 
+    def serialize(self, request, data, format, options=None):
+        """
+        Pass the coordinate precision on to the serializer, for formats which
+        encode coordinates at a fixed precision: the requested precision, or
+        else the objects' default, or else full precision.
+        """
+        options = options or {}
+
+        precision = parse_precision(request.GET.get('precision'))
+
+        if precision is None:
+            precision = self.get_default_precision(data)
+
+        options['precision'] = precision
+
+        return super(SluggedResource, self).serialize(request, data, format, options)
+
+    def get_default_precision(self, data):
+        """
+        The precision which keeps every coordinate of the objects being
+        serialized, each of which has already been rounded to its own
+        default, if it has one.
+        """
+        if isinstance(data, Bundle):
+            bundles = [data]
+        elif isinstance(data, dict):
+            bundles = [b for b in data.get('objects', []) if isinstance(b, Bundle)]
+        else:
+            bundles = []
+
+        precisions = [getattr(b.obj, 'get_precision', lambda: None)()
+                      for b in bundles]
+
+        if not precisions or None in precisions:
+            return MAX_PRECISION
+
+        return max(precisions)
+
     @classmethod
     def api_field_from_django_field(cls, f, default=CharField):
         """
@@ -1,6 +1,55 @@
-from tastypie.throttle import CacheThrottle
+import time
 
-class AnonymousThrottle(CacheThrottle):
+from django.core.cache import cache
+from tastypie.throttle import BaseThrottle
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    A throttle which keeps a single cache counter per identifier and window
+    of ``timeframe`` seconds. The rate over the last ``timeframe`` seconds is
+    estimated from the current and previous windows' counters, weighting the
+    previous one by how much of it still overlaps the sliding window.
+
+    Checking costs one ``get_many`` and recording an access one atomic
+    ``incr``, where ``CacheThrottle`` reads and rewrites a whole list of
+    timestamps for each. Counters expire after two windows, so
+    ``expiration`` is not used.
+    """
+    def get_window(self, now):
+        return int(now) // int(self.timeframe)
+
+    def get_window_key(self, identifier, window):
+        return '%s_%i' % (self.convert_identifier_to_key(identifier), window)
+
+    def should_be_throttled(self, identifier, **kwargs):
+        now = time.time()
+        window = self.get_window(now)
+        current_key = self.get_window_key(identifier, window)
+        previous_key = self.get_window_key(identifier, window - 1)
+
+        counts = cache.get_many([current_key, previous_key])
+
+        # How far into the current window we are, from 0 to 1
+        elapsed = (now - window * int(self.timeframe)) / float(self.timeframe)
+        rate = (counts.get(previous_key, 0) * (1 - elapsed)
+            + counts.get(current_key, 0))
+
+        return rate >= int(self.throttle_at)
+
+    def accessed(self, identifier, **kwargs):
+        key = self.get_window_key(identifier, self.get_window(time.time()))
+
+        try:
+            cache.incr(key)
+        except ValueError:
+            # First access in this window, unless another request beat us to
+            # creating the counter
+            if not cache.add(key, 1, 2 * int(self.timeframe)):
+                cache.incr(key)
+
+
+class AnonymousThrottle(SlidingWindowThrottle):
     """
     Anonymous users are throttled, but those with a valid API key are not.
     """
@@ -9,3 +58,9 @@ class AnonymousThrottle(CacheThrottle):
             return False
 
         return super(AnonymousThrottle, self).should_be_throttled(identifier, **kwargs)
+
+    def accessed(self, identifier, **kwargs):
+        if not identifier.startswith('anonymous_'):
+            return
+
+        super(AnonymousThrottle, self).accessed(identifier, **kwargs)
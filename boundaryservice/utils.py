@@ -1,4 +1,8 @@
+import inspect
+
 from django.conf import settings
+from django.contrib.gis.geos import (LinearRing, LineString, Point, Polygon,
+                                     GeometryCollection)
 
 def get_site_url_root():
     domain = getattr(settings, 'MY_SITE_DOMAIN', 'localhost')
@@ -23,6 +27,9 @@ class static_namer():
     def __call__(self, feature):
         return self.name
 
+    def map(self, table):
+        return [self.name] * len(table)
+
 
 class index_namer():
     """
@@ -37,6 +44,11 @@ class index_namer():
         self.i += 1
         return out
 
+    def map(self, table):
+        start = self.i
+        self.i += len(table)
+        return ['%s%i' % (self.prefix, i) for i in xrange(start, self.i)]
+
 
 class simple_namer():
     """
@@ -50,14 +62,213 @@ class simple_namer():
 
     def __call__(self, feature):
         attribute_values = map(str, map(feature.get, self.attribute_names))
-        name = self.seperator.join(attribute_values).strip()
-        
+        return self.finish(self.seperator.join(attribute_values).strip())
+
+    def map(self, table):
+        columns = [map(str, table.column(name)) for name in self.attribute_names]
+        names = [self.seperator.join(values).strip() for values in zip(*columns)]
+
+        if self.normalizer:
+            names = map(self.finish, names)
+
+        return names
+
+    def finish(self, name):
         if self.normalizer:
             normed = self.normalizer(name)
             if not normed:
                 raise ValueError('Failed to normalize \"%s\".' % name)
             else:
                 name = normed
-        
+
         return name
 
+
+def map_namer(namer, table):
+    """
+    Apply a namer to every row of an AttributeTable at once, if it can be.
+    Returns None for namers which only take one feature at a time.
+
+    A namer's map is only used if it was defined alongside the __call__ it
+    stands in for; a subclass which only overrides __call__ is called once
+    per feature, so its own logic isn't skipped.
+    """
+    if not hasattr(namer, 'map'):
+        return None
+
+    if defining_class(namer, 'map') is not defining_class(namer, '__call__'):
+        return None
+
+    return namer.map(table)
+
+
+def defining_class(obj, name):
+    """
+    Find the class in an object's hierarchy which defines an attribute.
+    """
+    for cls in inspect.getmro(obj.__class__):
+        if name in cls.__dict__:
+            return cls
+
+    return None
+
+
+class AttributeTable(object):
+    """
+    The attributes of every feature in an OGR layer, read column by column.
+
+    All columns are read in a single pass over the layer, by field index and
+    with the field types looked up once, rather than through a Field object
+    for every value. Values are as Feature.get would return them.
+    """
+    def __init__(self, layer):
+        # GDAL is only needed when loading, so the API doesn't require it
+        from django.contrib.gis.gdal.field import (OFTInteger, OFTReal,
+                                                   OFTDate, OFTTime,
+                                                   OFTDateTime)
+        from django.contrib.gis.gdal.prototypes import ds as capi
+
+        self.fields = layer.fields
+        self.columns = dict((name, []) for name in self.fields)
+        self.string_fields = []
+
+        readers = []
+        slow_fields = []
+
+        for i, (name, field_type) in enumerate(zip(self.fields, layer.field_types)):
+            append = self.columns[name].append
+
+            if field_type is OFTInteger:
+                readers.append((append, capi.get_field_as_integer, i))
+            elif field_type is OFTReal:
+                field_defn = capi.get_field_defn(layer._ldefn, i)
+
+                # Feature.get treats reals without precision as integers
+                if capi.get_field_precision(field_defn) == 0:
+                    as_double = capi.get_field_as_double
+                    readers.append((append,
+                        lambda feat, i: int(as_double(feat, i)), i))
+                else:
+                    readers.append((append, capi.get_field_as_double, i))
+            elif field_type in (OFTDate, OFTTime, OFTDateTime):
+                # Rare enough to read the slow way
+                slow_fields.append((append, name))
+            else:
+                # Everything else is read as a string
+                readers.append((append, capi.get_field_as_string, i))
+                self.string_fields.append(name)
+
+        self.length = 0
+
+        for feature in layer:
+            ptr = feature.ptr
+
+            for append, read, i in readers:
+                append(read(ptr, i))
+
+            for append, name in slow_fields:
+                append(feature.get(name))
+
+            self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def column(self, name):
+        """
+        Get all the values of a field.
+        """
+        return self.columns[name]
+
+    def rows(self, encoding=''):
+        """
+        Get the attributes of each feature as a dictionary, with string
+        fields decoded a column at a time.
+        """
+        columns = dict(self.columns)
+
+        if encoding:
+            for name in self.string_fields:
+                columns[name] = [value.decode(encoding) for value in columns[name]]
+
+        if not self.fields:
+            return [{} for i in xrange(self.length)]
+
+        return [dict(zip(self.fields, values))
+            for values in zip(*[columns[name] for name in self.fields])]
+
+
+#
+# Utility methods for reducing the precision of geometries
+#
+
+def quantize_geometry(geometry, precision):
+    """
+    Round the coordinates of a GEOS geometry to a number of decimal places,
+    dropping consecutive vertices that become duplicates. Rings and lines
+    which collapse are dropped; if nothing at all is left the original
+    geometry is returned.
+    """
+    quantized = _quantize(geometry, precision)
+
+    if quantized is None:
+        return geometry
+
+    return quantized
+
+
+def _quantize_coords(coords, precision):
+    out = []
+
+    for coord in coords:
+        coord = tuple([round(c, precision) for c in coord])
+
+        if not out or coord != out[-1]:
+            out.append(coord)
+
+    return out
+
+
+def _quantize(geometry, precision):
+    if isinstance(geometry, Point):
+        coords = _quantize_coords([geometry.coords], precision)[0]
+
+        return Point(*coords, srid=geometry.srid)
+
+    if isinstance(geometry, LinearRing):
+        coords = _quantize_coords(geometry.coords, precision)
+
+        if len(coords) < 4:
+            return None
+
+        return LinearRing(coords, srid=geometry.srid)
+
+    if isinstance(geometry, LineString):
+        coords = _quantize_coords(geometry.coords, precision)
+
+        if len(coords) < 2:
+            return None
+
+        return LineString(coords, srid=geometry.srid)
+
+    if isinstance(geometry, Polygon):
+        rings = [_quantize(ring, precision) for ring in geometry]
+
+        # A polygon without its exterior ring is no polygon at all
+        if rings[0] is None:
+            return None
+
+        return Polygon(*[r for r in rings if r is not None],
+            srid=geometry.srid)
+
+    if isinstance(geometry, GeometryCollection):
+        # Includes the Multi* geometries
+        parts = [_quantize(part, precision) for part in geometry]
+        parts = [p for p in parts if p is not None]
+
+        if not parts:
+            return None
+
+        return geometry.__class__(*parts, srid=geometry.srid)
+
+    return geometry
@@ -1,8 +1,9 @@
-from django.core.urlresolvers import reverse, resolve
 from django.http import Http404
-from django.shortcuts import get_object_or_404
 
 from boundaryservice.models import Boundary
+from boundaryservice.resources import BoundaryResource
+
+boundary_resource = BoundaryResource()
 
 def external_id_redirects(request, api_name, resource_name, slug, external_id):
     """
@@ -11,12 +12,15 @@ def external_id_redirects(request, api_name, resource_name, slug, external_id):
     if resource_name != 'boundary-set':
         raise Http404 
 
-    boundary = get_object_or_404(Boundary, set__slug=slug, external_id=external_id)
-    
-    # This bit of hacky code allows to execute the resource view as the canonical url were hit, but without redirecting
-    # Note that the resource will still have correct, canonical 'resource_uri' attribute attached
-    canonical_url = reverse('api_dispatch_detail', kwargs={'api_name': api_name, 'resource_name': 'boundary', 'slug': boundary.slug})
-    view, args, kwargs = resolve(canonical_url)
+    # Only the slug is needed to find the boundary again in the detail view
+    boundary_slugs = Boundary.objects.filter(set__slug=slug, set__live=True,
+        external_id=external_id).values_list('slug', flat=True)[:1]
 
-    return view(request, *args, **kwargs)
+    if not boundary_slugs:
+        raise Http404
+
+    # Execute the resource view as if the canonical url were hit, but without redirecting
+    # Note that the resource will still have correct, canonical 'resource_uri' attribute attached
+    view = boundary_resource.wrap_view('dispatch_detail')
 
+    return view(request, api_name=api_name, resource_name='boundary', slug=boundary_slugs[0])
@@ -16,6 +16,9 @@ setup(
         'boundaryservice.management',
         'boundaryservice.management.commands'
     ],
+    package_data={
+        'boundaryservice': ['sql/*.sql']
+    },
     install_requires=[
         'django-tastypie==0.9.12'
     ]